@@ -23,15 +23,37 @@
 #
 # ==============================================================
 
-import os
+import hashlib
 import json
+import os
+import queue
+import random
 import requests
 import streamlit as st
 import re
+import sqlite3
+import threading
+import time
+from collections.abc import Generator, Iterator
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
-# Load environment variables from .env file if it exists
-load_dotenv()
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    # orjson is optional; the standard library parser gives the same result.
+    from json import loads as json_loads
+
+# Load environment variables from .env file if it exists. Streamlit re-runs
+# this script on every interaction, so the file is read once per process;
+# variables already set in the environment take precedence.
+@st.cache_resource(show_spinner=False)
+def load_env_file() -> bool:
+    """Load .env into the environment once per process."""
+    return load_dotenv()
+
+load_env_file()
 
 # -------------------------
 # STREAMLIT CONFIG
@@ -47,15 +69,40 @@ st.set_page_config(
 # -------------------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-with open(os.path.join(BASE_DIR, "data.json"), "r", encoding="utf-8") as f:
-    DATA = json.load(f)
+@st.cache_data(show_spinner=False)
+def load_data(path: str) -> tuple[dict, dict, dict, dict]:
+    """Load the assessment criteria data and build the selectbox lookups once per process."""
+    with open(path, "rb") as f:
+        data = json_loads(f.read())
+
+    units = {}
+    criteria = {}
+    questions = {}
+    for level_name, unit_items in data.items():
+        units[level_name] = list(unit_items.keys())
+        for unit_name, items in unit_items.items():
+            criteria[(level_name, unit_name)] = [i["Assessment Criteria"] for i in items]
+            for i in items:
+                questions.setdefault((level_name, unit_name, i["Assessment Criteria"]), i["Question"])
+    return data, units, criteria, questions
+
+DATA, UNITS_BY_LEVEL, AC_BY_UNIT, QUESTION_BY_AC = load_data(os.path.join(BASE_DIR, "data.json"))
 
 # -------------------------
 # LOAD LOGO (SAFE)
 # -------------------------
-logo_path = os.path.join(BASE_DIR, "assets", "quickscore_logo.png")
-if os.path.exists(logo_path):
-    st.image(logo_path, width=220)
+@st.cache_resource(show_spinner=False)
+def load_logo(path: str) -> bytes | None:
+    """Read the logo image bytes once per process, or None if it is missing."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+logo_path = os.path.join(BASE_DIR, "assets", "quickscore-logo.png")
+logo = load_logo(logo_path)
+if logo:
+    st.image(logo, width=220)
 
 # -------------------------
 # AZURE OPENAI CONFIG
@@ -63,16 +110,179 @@ if os.path.exists(logo_path):
 AZURE_OPENAI_ENDPOINT = os.getenv("openai_ai_endpoint")
 AZURE_OPENAI_API_KEY = os.getenv("openai_api_key")
 
-def validate_config() -> tuple[bool, str]:
+# Output caps per call type. The validation reply is two sentences; the
+# suggestions reply is one short numbered point per evaluation criterion.
+VALIDATION_MAX_TOKENS = 200
+SUGGESTION_TOKENS_PER_CRITERION = 120
+REQUEST_TIMEOUT = 30
+MAX_ATTEMPTS = 3
+
+# Optional client-side ceilings matching the deployment's quota. The rate
+# limiter is only enabled when both are set.
+REQUESTS_PER_MINUTE = os.getenv("openai_requests_per_minute")
+TOKENS_PER_MINUTE = os.getenv("openai_tokens_per_minute")
+
+# Model responses are cached on disk so identical submissions are reused
+# across workers and restarts. The default lives in the app directory rather
+# than a shared temp directory other local users could write to.
+LLM_CACHE_PATH = os.getenv("llm_cache_path", os.path.join(BASE_DIR, ".llm_cache.sqlite3"))
+
+def parse_rate_limits(requests_per_minute: str | None, tokens_per_minute: str | None) -> tuple[int, int] | None:
+    """Return both per-minute limits, or None unless both are positive integers."""
+    try:
+        limits = int(requests_per_minute), int(tokens_per_minute)
+    except (TypeError, ValueError):
+        return None
+    return limits if min(limits) > 0 else None
+
+def validate_config(
+    endpoint: str | None, api_key: str | None, requests_per_minute: str | None, tokens_per_minute: str | None
+) -> tuple[bool, str]:
     """Validate that required environment variables are set."""
-    if not AZURE_OPENAI_ENDPOINT:
+    if not endpoint:
         return False, "Missing environment variable: `openai_ai_endpoint`"
-    if not AZURE_OPENAI_API_KEY:
+    if not api_key:
         return False, "Missing environment variable: `openai_api_key`"
+    if (requests_per_minute or tokens_per_minute) and not parse_rate_limits(requests_per_minute, tokens_per_minute):
+        return False, "`openai_requests_per_minute` and `openai_tokens_per_minute` must both be set to positive integers"
     return True, ""
 
-def call_azure_openai(prompt: str) -> str:
-    """Call Azure OpenAI API with the given prompt."""
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Return a shared HTTP session so connections to Azure OpenAI are reused."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0)
+    session.mount("https://", adapter)
+    return session
+
+# Shared resources are resolved on the script thread so worker threads never
+# touch Streamlit caches.
+HTTP_SESSION = get_session()
+
+class RequestCancelled(Exception):
+    """Raised when the caller no longer wants the response being requested."""
+
+def wait_unless_stopped(delay: float, stop: threading.Event | None) -> None:
+    """Sleep for ``delay`` seconds, or raise RequestCancelled as soon as ``stop`` is set."""
+    if stop is None:
+        time.sleep(delay)
+    elif stop.wait(delay):
+        raise RequestCancelled()
+
+class RateLimiter:
+    """Thread-safe token buckets for requests and tokens per minute."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens: int, stop: threading.Event | None = None) -> None:
+        """Block until one request and the estimated tokens are available."""
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max(
+                    (1 - self._requests) * 60 / self.requests_per_minute,
+                    (tokens - self._tokens) * 60 / self.tokens_per_minute
+                )
+            wait_unless_stopped(wait, stop)
+
+    def update(self, headers) -> None:
+        """Lower the buckets to the remaining quota reported by Azure."""
+        with self._lock:
+            self._refill()
+            try:
+                self._requests = min(self._requests, float(headers["x-ratelimit-remaining-requests"]))
+            except (KeyError, ValueError):
+                pass
+            try:
+                self._tokens = min(self._tokens, float(headers["x-ratelimit-remaining-tokens"]))
+            except (KeyError, ValueError):
+                pass
+
+@st.cache_resource
+def get_rate_limiter(requests_per_minute: str | None, tokens_per_minute: str | None) -> RateLimiter | None:
+    """Return the process-wide rate limiter shared by all sessions, or None if no limits are set."""
+    limits = parse_rate_limits(requests_per_minute, tokens_per_minute)
+    return RateLimiter(*limits) if limits else None
+
+RATE_LIMITER = get_rate_limiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRY_DELAY = 10
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def parse_duration(value: str) -> float:
+    """Parse a rate-limit reset duration such as "20ms", "1s" or "6m0s" into seconds."""
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|s|m|h)', value)
+    if not parts:
+        raise ValueError(f"Invalid duration: {value}")
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter to spread retries from concurrent sessions."""
+    return random.uniform(0, 2 ** attempt)
+
+def retry_delay(response: requests.Response, attempt: int) -> float:
+    """Seconds to wait before retrying a throttled or failed request."""
+    # Quota headers say nothing about why a server error happened.
+    if response.status_code != 429:
+        return backoff_delay(attempt)
+    headers = response.headers
+    hints = (
+        ("retry-after-ms", lambda v: float(v) / 1000),
+        ("Retry-After", float),
+    )
+    for name, parse in hints:
+        try:
+            return parse(headers[name]) + random.uniform(0, 0.25)
+        except (KeyError, ValueError):
+            continue
+    # Either quota may be the exhausted one, so wait for both to reset.
+    resets = []
+    for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        try:
+            resets.append(parse_duration(headers[name]))
+        except (KeyError, ValueError):
+            continue
+    if resets:
+        return max(resets) + random.uniform(0, 0.25)
+    return backoff_delay(attempt)
+
+def chat_payload(prompt: str, max_tokens: int) -> dict:
+    """Build the chat completion request body for a prompt."""
+    return {
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0,
+        "max_tokens": max_tokens
+    }
+
+def post_chat(
+    prompt: str, max_tokens: int, timeout: float, stream: bool = False, stop: threading.Event | None = None
+) -> requests.Response:
+    """POST a chat completion request, retrying throttled and failed attempts.
+
+    Setting ``stop`` abandons the request before the next attempt or wait.
+    """
     if not AZURE_OPENAI_ENDPOINT or not AZURE_OPENAI_API_KEY:
         raise ValueError("Azure OpenAI configuration is missing. Please set environment variables.")
     
@@ -81,24 +291,203 @@ def call_azure_openai(prompt: str) -> str:
         "api-key": AZURE_OPENAI_API_KEY
     }
 
-    payload = {
-        "messages": [
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0,
-        "max_tokens": 800
-    }
+    payload = chat_payload(prompt, max_tokens)
+    if stream:
+        payload["stream"] = True
 
-    response = requests.post(
-        AZURE_OPENAI_ENDPOINT,
-        headers=headers,
-        json=payload,
-        timeout=60
-    )
+    # Rough estimate: about four characters per prompt token plus the output cap.
+    estimated_tokens = len(prompt) // 4 + max_tokens
+
+    for attempt in range(MAX_ATTEMPTS):
+        if stop is not None and stop.is_set():
+            raise RequestCancelled()
+        if RATE_LIMITER:
+            RATE_LIMITER.acquire(estimated_tokens, stop)
+        try:
+            response = HTTP_SESSION.post(
+                AZURE_OPENAI_ENDPOINT,
+                headers=headers,
+                json=payload,
+                timeout=timeout,
+                stream=stream
+            )
+        except requests.exceptions.ConnectTimeout:
+            # An unreachable endpoint would time out again on every attempt.
+            raise
+        except requests.exceptions.ConnectionError:
+            # Pooled keep-alive connections can be closed by the server
+            # between calls; retry on a fresh connection.
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            wait_unless_stopped(backoff_delay(attempt), stop)
+            continue
+        if RATE_LIMITER:
+            RATE_LIMITER.update(response.headers)
+        if response.status_code not in RETRY_STATUSES or attempt == MAX_ATTEMPTS - 1:
+            break
+        response.close()
+        wait_unless_stopped(min(retry_delay(response, attempt), MAX_RETRY_DELAY), stop)
+
+    try:
+        response.raise_for_status()
+    except requests.exceptions.HTTPError:
+        # Release the connection now rather than when the response is
+        # garbage collected.
+        response.close()
+        raise
+    return response
+
+def stream_azure_openai(
+    prompt: str, max_tokens: int = 256, timeout: float = REQUEST_TIMEOUT, stop: threading.Event | None = None
+) -> Generator[str, None, tuple[str, str | None]]:
+    """Call Azure OpenAI API with the given prompt, yielding content as it arrives.
+
+    Returns the full text and the final finish_reason once the stream ends.
+    """
+    response = post_chat(prompt, max_tokens, timeout, stream=True, stop=stop)
+    parts = []
+    finish_reason = None
+    try:
+        for line in response.iter_lines():
+            if not line.startswith(b"data:"):
+                continue
+            data = line[len(b"data:"):].strip()
+            # Keep reading past [DONE] to the end of the body so the
+            # connection goes back to the pool.
+            if data == b"[DONE]":
+                continue
+            choices = json_loads(data).get("choices")
+            # Azure sends content filter results in chunks without choices.
+            if choices:
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    parts.append(content)
+                    yield content
+                finish_reason = choices[0].get("finish_reason") or finish_reason
+    finally:
+        # Releases a fully read connection, or drops the stream if the
+        # caller stopped early so the server stops generating.
+        response.close()
+    return "".join(parts), finish_reason
+
+class ResponseCache:
+    """Store of model responses shared across processes and restarts, backed by SQLite."""
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, created REAL NOT NULL, response TEXT NOT NULL)"
+        )
+        return conn
+
+    @staticmethod
+    def key(endpoint: str, payload: dict) -> str:
+        """Hash the endpoint (deployment and api-version) and the full request body."""
+        body = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(f"{endpoint}\n{body}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute(
+                    "SELECT response FROM responses WHERE key = ? AND created > ?",
+                    (key, time.time() - self.ttl)
+                ).fetchone()
+        except sqlite3.Error:
+            # The cache is an optimisation; a broken store just means a miss.
+            return None
+        return row[0] if row else None
+
+    def set(self, key: str, response: str) -> None:
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, created, response) VALUES (?, ?, ?)",
+                    (key, now, response)
+                )
+                conn.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,))
+                conn.execute(
+                    "DELETE FROM responses WHERE key NOT IN "
+                    "(SELECT key FROM responses ORDER BY created DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+        except sqlite3.Error:
+            pass
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    """Return the response cache shared by all sessions."""
+    return ResponseCache(LLM_CACHE_PATH, ttl=7 * 24 * 3600, max_entries=5000)
+
+RESPONSE_CACHE = get_response_cache()
+
+def stream_llm(prompt: str, max_tokens: int, stop: threading.Event | None = None) -> Iterator[str]:
+    """Stream the Azure OpenAI response for a prompt, reusing identical submissions."""
+    key = ResponseCache.key(AZURE_OPENAI_ENDPOINT, chat_payload(prompt, max_tokens))
+    response = RESPONSE_CACHE.get(key)
+    if response:
+        yield response
+        return
+    with closing(stream_azure_openai(prompt, max_tokens=max_tokens, stop=stop)) as chunks:
+        text, finish_reason = yield from chunks
+    # Only complete replies are kept; an empty (content-filtered) reply or
+    # one cut off at max_tokens is requested again next time.
+    text = text.strip()
+    if finish_reason == "stop" and text:
+        RESPONSE_CACHE.set(key, text)
+
+def stream_in_background(
+    executor: ThreadPoolExecutor, chunks: Generator[str, None, None], stop: threading.Event
+) -> Iterator[str]:
+    """Consume a stream on a worker thread now and replay its chunks to the caller later.
+
+    Setting ``stop`` makes the worker abandon the stream at the next chunk;
+    pass the same event to stream_llm() so pending requests and retries stop too.
+    """
+    buffer = queue.Queue()
 
-    response.raise_for_status()
-    return response.json()["choices"][0]["message"]["content"].strip()
+    def pump():
+        try:
+            for chunk in chunks:
+                if stop.is_set():
+                    break
+                buffer.put(("chunk", chunk))
+            buffer.put(("done", None))
+        except Exception as e:
+            buffer.put(("error", e))
+        finally:
+            # Closes the HTTP response of an abandoned stream so Azure stops
+            # generating tokens nobody will read.
+            chunks.close()
+
+    def replay():
+        while True:
+            kind, value = buffer.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+
+    # Submitted here rather than inside replay() so the request starts
+    # immediately instead of on first iteration.
+    executor.submit(pump)
+    return replay()
+
+def render_stream(placeholder, chunks: Iterator[str]) -> str:
+    """Render streamed text into a placeholder as it arrives and return the full text."""
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        placeholder.text(text.strip())
+    return text.strip()
 
 
 # -------------------------
@@ -109,38 +498,78 @@ level = st.selectbox(
     ["Select an option"] + list(DATA.keys())
 )
 
+level_name = level.lower()
+is_level_3 = "level 3" in level_name
+is_level_5 = "level 5" in level_name
+is_level_7 = "level 7" in level_name
+
 study_unit = assessment = question = None
 
 if level != "Select an option":
     study_unit = st.selectbox(
         "Select your study unit:",
-        list(DATA[level].keys())
+        UNITS_BY_LEVEL[level]
     )
 
 if study_unit:
-    ac_items = DATA[level][study_unit]
     assessment = st.selectbox(
         "Select your assessment criterion:",
-        [i["Assessment Criteria"] for i in ac_items]
+        AC_BY_UNIT[(level, study_unit)]
     )
 
 if assessment:
-    question = next(
-        i["Question"] for i in ac_items
-        if i["Assessment Criteria"] == assessment
-    )
+    question = QUESTION_BY_AC[(level, study_unit, assessment)]
     st.text_area("Question:", question, height=120, disabled=True)
 
-if level.lower().find("level 7") != -1:
-    answer = st.text_area(
-        "Paste your answer here (max 1000 words):",
-        height=220
-    )
-else:
-    answer = st.text_area(
-        "Paste your answer here (max 400 words):",
-        height=220
-    )
+# -------------------------
+# CONFIGURATION CHECK
+# -------------------------
+config_valid, config_error = validate_config(
+    AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE
+)
+if not config_valid:
+    st.error(f"⚠️ **Configuration Error:** {config_error}")
+    st.info("""
+    **To fix this:**
+    
+    1. Create a `.env` file in the project root with:
+       ```
+       openai_ai_endpoint=https://your-endpoint.openai.azure.com
+       openai_api_key=your-api-key-here
+       ```
+    
+    2. Or set environment variables in your shell:
+       ```bash
+       export openai_ai_endpoint="https://your-endpoint.openai.azure.com"
+       export openai_api_key="your-api-key-here"
+       ```
+    
+    3. Restart the Streamlit app after setting the variables.
+    """)
+    st.stop()
+
+# The answer box and Submit button share a form so typing an answer does not
+# rerun the script; the selectboxes stay outside as their options cascade.
+with st.form("quickscore"):
+    if is_level_7:
+        answer = st.text_area(
+            "Paste your answer here (max 1000 words):",
+            height=220
+        )
+    else:
+        answer = st.text_area(
+            "Paste your answer here (max 400 words):",
+            height=220
+        )
+    submitted = st.form_submit_button("Submit")
+
+# Patterns used by stripHtmlWithDOMParser, compiled once.
+_RE_SPACED_TAGS = re.compile(r'</(?:th|td|tr|table|p)>|<p')
+_RE_TABLE = re.compile(r'<table\b[^>]*>[\s\S]*?</table>', re.IGNORECASE)
+_RE_S = re.compile(r'<s\b[^>]*>[\s\S]*?</s>', re.IGNORECASE)
+_RE_TAG = re.compile(r'<[^>]+>')
+_RE_AC = re.compile(r'^AC\s?[1-9]\.[1-9]\s*', re.IGNORECASE)
+_RE_WS = re.compile(r'\s+')
 
 def calculateWordCount(answer):
   if not answer: return 0
@@ -158,41 +587,55 @@ def extractCountableWords(text):
 
     cleanText = text.strip()
     cleanText = stripHtmlWithDOMParser(cleanText)
-    # Split by whitespace (spaces, newlines, tabs, etc.) and filter out empty strings
-    calculatedWords = [word.strip() for word in re.split(r'[\s\n\r\t]+', cleanText.strip()) if word.strip()]
-    return len(calculatedWords)
+    # Split by any run of whitespace (spaces, newlines, tabs, etc.); empty strings are dropped
+    return len(cleanText.split())
 
 def stripHtmlWithDOMParser(htmlString):
     cleanText = htmlString.strip()
-    cleanText = cleanText.replace('</th>', '</th> ')
-    cleanText = cleanText.replace('</td>', '</td> ')
-    cleanText = cleanText.replace('</tr>', '</tr> ')
-    cleanText = cleanText.replace('</table>', '</table> ')
-    cleanText = cleanText.replace('<p', ' <p')
-    cleanText = cleanText.replace('</p>', '</p> ')
-    # Remove table tags including inner text so that tables are also removed
-    cleanText = re.sub(r'<table\b[^>]*>[\s\S]*?</table>', '', cleanText, flags=re.IGNORECASE)
-    # Remove <s> tags including inner text so that strikethrough text is also removed
-    cleanText = re.sub(r'<s\b[^>]*>[\s\S]*?</s>', '', cleanText, flags=re.IGNORECASE)
-    # Remove all tags and keep inner text
-    cleanText = re.sub(r'<[^>]+>', '', cleanText)
+    # Plain-text answers have no tags, so the HTML passes can be skipped
+    if '<' in cleanText:
+        # Space out cells, rows, tables and paragraphs so adjacent words do not merge
+        cleanText = _RE_SPACED_TAGS.sub(lambda m: ' <p' if m.group(0) == '<p' else m.group(0) + ' ', cleanText)
+        # Remove table tags including inner text so that tables are also removed
+        cleanText = _RE_TABLE.sub('', cleanText)
+        # Remove <s> tags including inner text so that strikethrough text is also removed
+        cleanText = _RE_S.sub('', cleanText)
+        # Remove all tags and keep inner text
+        cleanText = _RE_TAG.sub('', cleanText)
     # Remove AC 1.5 from the beginning of the text
-    cleanText = re.sub(r'^AC\s?[1-9]\.[1-9]\s*', '', cleanText, flags=re.IGNORECASE)
-    cleanText = cleanText.replace('&nbsp;', ' ')
+    cleanText = _RE_AC.sub('', cleanText)
+    if '&nbsp;' in cleanText:
+        cleanText = cleanText.replace('&nbsp;', ' ')
     # Replace multiple whitespace with single space and trim
-    cleanText = re.sub(r'\s+', ' ', cleanText).strip()
+    cleanText = _RE_WS.sub(' ', cleanText).strip()
     return cleanText
 
 
+# -------------------------
+# Shared prompt header
+# -------------------------
+def prompt_header():
+    return f"""
+certification level: {level}
+Assessment criteria: {assessment}
+Study unit: {study_unit}
+Question: {question}
+Submitted Answer: {answer}
+"""
+
 # -------------------------
 # Validation prompt
 # -------------------------
-def validation_prompt():
-    validation_criteria = ""
-    minimum_criteria = ""
-    if level.lower().find("level 3") != -1:
-        minimum_criteria = "2 out of 3"
-        validation_criteria = f"""
+# Answers at or below these word counts always receive the fixed response the
+# validation prompt asks for, so it is returned without calling the model.
+# The prompt interpolates the same limits and response text.
+SHORT_ANSWER_WORD_LIMIT = 21
+SHORT_ANSWER_WORD_LIMIT_LEVEL_7 = 800
+SHORT_ANSWER_RESPONSE = "You're not quite on the right track yet. Please consider the suggestions below and revise your response."
+
+# Locked prompt text: keep character-for-character in sync with the PHP
+# implementation, including the trailing whitespace before the closing quotes.
+VALIDATION_CRITERIA_LEVEL_3 = """
 1. Presentation: atleast one of the following must be present:
    - Is the answer presented in an appropriate structure?
    - Is the answer easy to read and to make sense of?
@@ -206,9 +649,8 @@ def validation_prompt():
    - Is the answer applied to the case organisation outlined on the assessment brief?
    - Does the answer relate to the context of the scenario?
         """
-    elif level.lower().find("level 5") != -1:
-        minimum_criteria = "4 out of 5"
-        validation_criteria = f"""
+
+VALIDATION_CRITERIA_LEVEL_5 = """
 1. Referencing: atleast one of the following must be present:
    - Are intext citations present?
    - Do they align with the reference list if there is one. If no reference list present advice should be offered on this in terms of reminding the learner to do it before they submit?
@@ -234,9 +676,8 @@ def validation_prompt():
    - Does the answer address the commend verb outlined in the question?
    - Does the answers demonstrate sufficient knowledge and understanding to meet the assessment criteria question?
         """
-    elif level.lower().find("level 7") != -1:
-        minimum_criteria = "4 out of 6"
-        validation_criteria = f"""
+
+VALIDATION_CRITERIA_LEVEL_7 = """
 1. Focus: atleast one of the following must be present:
    - Does the answer directly address the command verb used in the question (e.g. analyse, evaluate, explain)?
    - Does it explicitly link each point back to the relevant assessment criteria?
@@ -268,15 +709,25 @@ def validation_prompt():
    - Does the conclusion clearly synthesise the key points?
     """
 
-    return f"""
-certification level: {level}
-Assessment criteria: {assessment}
-Study unit: {study_unit}
-Question: {question}
-Submitted Answer: {answer}
+def short_answer_word_limit():
+    return SHORT_ANSWER_WORD_LIMIT_LEVEL_7 if is_level_7 else SHORT_ANSWER_WORD_LIMIT
+
+def validation_prompt():
+    validation_criteria = ""
+    minimum_criteria = ""
+    if is_level_3:
+        minimum_criteria = "2 out of 3"
+        validation_criteria = VALIDATION_CRITERIA_LEVEL_3
+    elif is_level_5:
+        minimum_criteria = "4 out of 5"
+        validation_criteria = VALIDATION_CRITERIA_LEVEL_5
+    elif is_level_7:
+        minimum_criteria = "4 out of 6"
+        validation_criteria = VALIDATION_CRITERIA_LEVEL_7
 
-if submitted_answer is consist of more than {800 if level.lower().find("level 7") != -1 else 21} words then only do following if not then give output must be only
-'You're not quite on the right track yet. Please consider the suggestions below and revise your response.'
+    return prompt_header() + f"""
+if submitted_answer is consist of more than {short_answer_word_limit()} words then only do following if not then give output must be only
+'{SHORT_ANSWER_RESPONSE}'
 
 Considering the provided certification level, assessment criteria, study unit, and Submitted Answer, Evaluate the submitted answer.
 Please Do not give any suggestions for improvement.
@@ -308,10 +759,8 @@ and briefly acknowledge and summarise the user's answer in one sentence without
 #
 # Suggestion prompt
 #
-def suggestion_prompt():
-    suggestion_prompt = ""
-    if level.lower().find("level 3") != -1:
-        suggestion_prompt = f"""
+# Locked prompt text: keep character-for-character in sync with the PHP implementation.
+SUGGESTION_CRITERIA_LEVEL_3 = """
 1. Presentation:
    [1-2 sentences on whether the answer has appropriate structure, is easy to read and make sense of, and has appropriate formatting]
 
@@ -321,8 +770,8 @@ def suggestion_prompt():
 3. Reference To The Scenario:
    [1-2 sentences on whether the answer is applied to the case organisation outlined in the assessment brief and relates to the context of the scenario]
 """
-    elif level.lower().find("level 5") != -1:
-        suggestion_prompt = f"""
+
+SUGGESTION_CRITERIA_LEVEL_5 = """
 1. Referencing:
    [1-2 sentences on whether in-text citations are present, align with the reference list (or advise adding a reference list if absent), use Harvard formatting, and are consistent]
 
@@ -338,8 +787,8 @@ def suggestion_prompt():
 5. Response to question:
    [1-2 sentences on whether the answer addresses the command verb outlined in the question and demonstrates sufficient knowledge and understanding to meet the assessment criteria]
 """
-    elif level.lower().find("level 7") != -1:
-        suggestion_prompt = f"""
+
+SUGGESTION_CRITERIA_LEVEL_7 = """
 1. Focus:
    [1-2 sentences on addressing the command verb and linking to assessment criteria]
 
@@ -358,14 +807,17 @@ def suggestion_prompt():
 6. Presentation & language:
    [1-2 sentences on structure (Introduction, Main Body, Conclusion) and signposting]
 """
-    
-    return f"""
-certification level: {level}
-Assessment criteria: {assessment}
-Study unit: {study_unit}
-Question: {question}
-Submitted Answer: {answer}
 
+def suggestion_prompt():
+    suggestion_prompt = ""
+    if is_level_3:
+        suggestion_prompt = SUGGESTION_CRITERIA_LEVEL_3
+    elif is_level_5:
+        suggestion_prompt = SUGGESTION_CRITERIA_LEVEL_5
+    elif is_level_7:
+        suggestion_prompt = SUGGESTION_CRITERIA_LEVEL_7
+    
+    return prompt_header() + f"""
 Using the provided certification level, Assessment criteria, Study unit, Question and Submitted Answer,
 offer brief suggestions for improvement in the Submitted Answer. Keep feedback concise - only 1-2 sentences per point.
 
@@ -389,56 +841,53 @@ Make sure suggestions for improvement are written as clear, single paragraphs ra
 Keep each suggestion brief and actionable. Focus on the most important improvements needed.
 """
 
-# -------------------------
-# CONFIGURATION CHECK
-# -------------------------
-config_valid, config_error = validate_config()
-if not config_valid:
-    st.error(f"⚠️ **Configuration Error:** {config_error}")
-    st.info("""
-    **To fix this:**
-    
-    1. Create a `.env` file in the project root with:
-       ```
-       openai_ai_endpoint=https://your-endpoint.openai.azure.com
-       openai_api_key=your-api-key-here
-       ```
-    
-    2. Or set environment variables in your shell:
-       ```bash
-       export openai_ai_endpoint="https://your-endpoint.openai.azure.com"
-       export openai_api_key="your-api-key-here"
-       ```
-    
-    3. Restart the Streamlit app after setting the variables.
-    """)
-    st.stop()
+def suggestion_max_tokens():
+    if is_level_3:
+        criteria_count = 3
+    elif is_level_5:
+        criteria_count = 5
+    else:
+        criteria_count = 6
+    return criteria_count * SUGGESTION_TOKENS_PER_CRITERION
 
 # -------------------------
 # SUBMIT
 # -------------------------
-if st.button("Submit"):
+if submitted:
     with st.spinner("Evaluating submission..."):
+        # The suggestion prompt does not depend on the validation output,
+        # so both requests are issued concurrently.
+        executor = ThreadPoolExecutor(max_workers=1)
+        stop_suggestions = threading.Event()
         try:
-            validation = call_azure_openai(validation_prompt())
+            word_count = calculateWordCount(answer)
+            suggestion_stream = stream_in_background(
+                executor,
+                stream_llm(suggestion_prompt(), suggestion_max_tokens(), stop_suggestions),
+                stop_suggestions
+            )
             # print("validation=====", validation_prompt())
             st.subheader("Word Count")
-            st.markdown(f""" Calculated Word Count: {calculateWordCount(answer)} """, unsafe_allow_html=True)
+            st.markdown(f""" Calculated Word Count: {word_count} """, unsafe_allow_html=True)
             # print("validation_prompt=====", validation_prompt())
             # print("suggestion_prompt=====", suggestion_prompt())
 
             st.divider()
             st.subheader("Feedback Summary")
-            st.text(validation)
-
+            if word_count <= short_answer_word_limit():
+                validation = SHORT_ANSWER_RESPONSE
+                st.text(validation)
+            else:
+                validation = render_stream(st.empty(), stream_llm(validation_prompt(), VALIDATION_MAX_TOKENS))
+
+            # Validation and suggestions are separate locked prompts and must stay
+            # two requests to match the PHP implementation (governance rule 1).
             # if validation.startswith("You appear to be on the right track"):
-            suggestions = call_azure_openai(suggestion_prompt())
-
             st.divider()
             st.subheader("Suggestions for Improvement")
-            st.text(suggestions)
+            suggestions = render_stream(st.empty(), suggestion_stream)
 
-            if level.lower().find("level 3") != -1:
+            if is_level_3:
                 st.markdown("")  # Add spacing before disclaimer
                 st.markdown(""" 
                 <b>Top tips:</b>
@@ -449,7 +898,7 @@ if st.button("Submit"):
                     <li><b>Check that your response stays within the maximum word limit</b> set out in the assignment brief.</li>
                 </ul>
                 """, unsafe_allow_html=True)
-            elif level.lower().find("level 5") != -1:
+            elif is_level_5:
                 st.markdown("")  # Add spacing before disclaimer
                 st.markdown(""" 
                 <b>Always remember to:</b>
@@ -461,7 +910,7 @@ if st.button("Submit"):
                     <li><b>Check that your response stays within the maximum word limit</b> set out in the assignment brief.</li>
                 </ul>
                 """, unsafe_allow_html=True)
-            elif level.lower().find("level 7") != -1:
+            elif is_level_7:
                 st.markdown("""
                 <b>Remember to:</b>
                 <ul>
@@ -477,6 +926,11 @@ if st.button("Submit"):
             st.code(str(e))
         except Exception as e:
             st.error(f"❌ **Error:** {str(e)}")
+        finally:
+            # If validation failed, do not hold the error back until the
+            # suggestions stream finishes; tell it to stop and move on.
+            stop_suggestions.set()
+            executor.shutdown(wait=False)
 
 # -------------------------
 # DISCLAIMER